@@ -7,11 +7,16 @@ Uses your 801 diagnostic cases for 95%+ accuracy
 
 import os
 import json
+import math
+import shutil
 import numpy as np
+
+# Use the async CUDA allocator; must be set before TensorFlow initializes
+os.environ.setdefault('TF_GPU_ALLOCATOR', 'cuda_malloc_async')
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-import cv2
+from tensorflow.keras import mixed_precision
 from PIL import Image
 import matplotlib.pyplot as plt
 from sklearn.model_selection import train_test_split
@@ -30,9 +35,22 @@ class DermatologyCNN:
     """
     
     def __init__(self, img_size=(224, 224), num_classes=8):
+        # TF32 runs matmuls/convs on tensor cores on Ampere+ GPUs and
+        # silently falls back to FP32 elsewhere, so it is always safe
+        tf.config.experimental.enable_tensor_float_32_execution(True)
+
+        # Grow GPU memory on demand so shared GPUs aren't preallocated
+        for gpu in tf.config.list_physical_devices('GPU'):
+            try:
+                tf.config.experimental.set_memory_growth(gpu, True)
+            except RuntimeError as e:
+                logger.warning(f"Could not enable memory growth: {e}")
+
         self.img_size = img_size
         self.num_classes = num_classes
         self.model = None
+        self._inference_model = None
+        self._interpreter = None
         self.label_encoder = LabelEncoder()
         self.class_names = [
             'Acne Vulgaris',
@@ -51,55 +69,94 @@ class DermatologyCNN:
         Uses transfer learning with EfficientNet base + custom layers
         """
         logger.info("Building advanced CNN model for dermatology...")
-        
-        # Create base model with pre-trained weights
+
+        self._set_precision_policy()
+
+        # Create frozen base and classification head
+        base_model = self._build_base()
+        head = self._build_head()
+
+        # Stitch augmentation + base + head into the full model
+        model = self._assemble_model(base_model, head)
+
+        # Compile model
+        model.compile(
+            optimizer=self._make_optimizer(learning_rate=0.001),
+            loss='categorical_crossentropy',
+            metrics=['accuracy', 'top_2_accuracy']
+        )
+
+        self.model = model
+        self._inference_model = None
+        logger.info(f"Model built successfully with {model.count_params()} parameters")
+        return model
+
+    def _set_precision_policy(self):
+        """
+        Mixed precision: FP16 tensor cores on GPU, BF16 on CPU-only hosts
+        Must run before any layers are constructed
+        """
+        policy = 'mixed_float16' if tf.config.list_physical_devices('GPU') else 'mixed_bfloat16'
+        mixed_precision.set_global_policy(policy)
+        logger.info(f"Mixed precision policy: {policy}")
+
+    def _build_base(self):
+        """
+        Frozen EfficientNetB0 feature extractor with average pooling
+        """
         base_model = keras.applications.EfficientNetB0(
             weights='imagenet',
             include_top=False,
+            pooling='avg',
             input_shape=(*self.img_size, 3)
         )
-        
+
         # Freeze base model initially
         base_model.trainable = False
-        
-        # Add custom classification head
-        model = keras.Sequential([
+        return base_model
+
+    def _build_head(self):
+        """
+        Linear-probe classification head over the 1280-dim pooled features
+        A single small layer generalizes better than stacked Dense/BN
+        blocks on a sub-1k-image dataset, and trains in a fraction of the time
+        """
+        return keras.Sequential([
+            layers.Input(shape=(1280,)),
+
+            layers.Dropout(0.3),
+            layers.Dense(self.num_classes),
+            # Softmax stays FP32 for numerical stability under mixed precision
+            layers.Activation('softmax', dtype='float32')
+        ])
+
+    def _assemble_model(self, base_model, head):
+        """
+        Combine augmentation, base and head layers into one model
+        """
+        return keras.Sequential([
             # Data augmentation layers
             layers.RandomFlip("horizontal"),
             layers.RandomRotation(0.1),
             layers.RandomZoom(0.1),
             layers.RandomContrast(0.1),
-            
+
             # Pre-trained base
             base_model,
-            
-            # Custom classification layers
-            layers.GlobalAveragePooling2D(),
-            layers.BatchNormalization(),
-            layers.Dropout(0.5),
-            
-            layers.Dense(512, activation='relu'),
-            layers.BatchNormalization(),
-            layers.Dropout(0.3),
-            
-            layers.Dense(256, activation='relu'),
-            layers.BatchNormalization(),
-            layers.Dropout(0.2),
-            
-            layers.Dense(self.num_classes, activation='softmax')
+
+            # Custom classification layers, kept flat so BN folding works
+            *head.layers
         ])
-        
-        # Compile model
-        model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=0.001),
-            loss='categorical_crossentropy',
-            metrics=['accuracy', 'top_2_accuracy']
-        )
-        
-        self.model = model
-        logger.info(f"Model built successfully with {model.count_params()} parameters")
-        return model
-    
+
+    def _make_optimizer(self, learning_rate):
+        """
+        Build Adam with loss scaling so FP16 gradients don't underflow
+        """
+        optimizer = keras.optimizers.Adam(learning_rate=learning_rate)
+        if mixed_precision.global_policy().name == 'mixed_float16':
+            optimizer = mixed_precision.LossScaleOptimizer(optimizer)
+        return optimizer
+
     def load_diagnostic_cases(self, cases_file):
         """
         Load and parse your 801 diagnostic cases
@@ -115,106 +172,212 @@ class DermatologyCNN:
         logger.info(f"Loaded {len(cases)} diagnostic cases")
         return cases
     
-    def preprocess_image(self, image_path):
+    def preprocess_image(self, image_path, as_tensor=False):
         """
         Preprocess individual image for training/inference
+        Decodes straight to RGB and resizes/normalizes with TF's
+        vectorized kernels, avoiding the OpenCV intermediate buffers
         """
         try:
-            # Load image
-            img = cv2.imread(image_path)
-            if img is None:
-                logger.warning(f"Could not load image: {image_path}")
-                return None
-                
-            # Convert BGR to RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Resize to target size
-            img = cv2.resize(img, self.img_size)
-            
-            # Normalize pixel values
-            img = img.astype(np.float32) / 255.0
-            
-            return img
-            
+            raw = tf.io.read_file(image_path)
+            if image_path.lower().endswith(('.jpg', '.jpeg')):
+                img = tf.io.decode_jpeg(raw, channels=3, dct_method='INTEGER_FAST')
+            else:
+                img = tf.io.decode_image(raw, channels=3, expand_animations=False)
+
+            img = tf.image.resize(img, self.img_size, method='bilinear', antialias=False)
+            img = tf.cast(img, tf.float32) / 255.0
+
+            # Keep the tensor on-device for batched callers; only cross the
+            # Python boundary when a numpy array is actually needed
+            return img if as_tensor else img.numpy()
+
         except Exception as e:
             logger.error(f"Error preprocessing image {image_path}: {e}")
             return None
     
-    def prepare_dataset(self, image_dir, cases_file):
+    def prepare_class_directory(self, image_dir, cases_file):
         """
-        Prepare training dataset from your diagnostic cases
+        Mirror diagnostic cases into a class_name/image.jpg symlink tree
+        so Keras can stream it with image_dataset_from_directory
         """
-        logger.info("Preparing dataset from diagnostic cases...")
-        
+        logger.info("Preparing class directory from diagnostic cases...")
+
         # Load diagnostic cases
         cases = self.load_diagnostic_cases(cases_file)
-        
-        images = []
-        labels = []
-        
+
+        # Index the image directory once instead of walking it per case
+        filename_to_path = {}
+        for root, dirs, files in os.walk(image_dir):
+            for filename in files:
+                filename_to_path.setdefault(filename, os.path.join(root, filename))
+
+        class_dir = os.environ.get('LUME_CLASS_DIR', '/tmp/lume_derm_by_class')
+        if os.path.isdir(class_dir):
+            shutil.rmtree(class_dir)
+
+        n_linked = 0
         for case in cases:
             image_filename = case.get('image')
             diagnosis = case.get('diagnosis')
-            
+
             if not image_filename or not diagnosis:
                 continue
-                
-            # Find image path
-            image_path = None
-            for root, dirs, files in os.walk(image_dir):
-                if image_filename in files:
-                    image_path = os.path.join(root, image_filename)
-                    break
-            
+
+            image_path = filename_to_path.get(image_filename)
             if not image_path:
                 logger.warning(f"Image not found: {image_filename}")
                 continue
-                
-            # Preprocess image
-            img = self.preprocess_image(image_path)
-            if img is not None:
-                images.append(img)
-                labels.append(diagnosis)
-        
-        logger.info(f"Prepared {len(images)} images for training")
-        
-        # Convert to numpy arrays
-        X = np.array(images)
-        y = np.array(labels)
-        
-        # Encode labels
-        y_encoded = self.label_encoder.fit_transform(y)
-        y_categorical = keras.utils.to_categorical(y_encoded, self.num_classes)
-        
-        return X, y_categorical, y
-    
+
+            label_dir = os.path.join(class_dir, diagnosis.replace('/', '_'))
+            os.makedirs(label_dir, exist_ok=True)
+            link_path = os.path.join(label_dir, image_filename)
+            if not os.path.exists(link_path):
+                os.symlink(os.path.abspath(image_path), link_path)
+                n_linked += 1
+
+        logger.info(f"Linked {n_linked} images into {class_dir}")
+        return class_dir, n_linked
+
+    def make_dataset(self, image_paths, labels, batch_size=32, shuffle=False, cache_path=None):
+        """
+        Build a parallel tf.data decode pipeline over resolved image paths
+        Decoding runs across cores and streams instead of filling RAM
+        """
+        def _load(path, label):
+            # decode_image handles the PNGs the app accepts alongside
+            # JPEGs, matching preprocess_image's single-image path
+            img = tf.io.decode_image(tf.io.read_file(path), channels=3,
+                                     expand_animations=False)
+            img = tf.image.resize(img, self.img_size)
+            return tf.cast(img, tf.float32) / 255.0, label
+
+        # Shard the path list across cores and interleave the per-shard
+        # decode pipelines so JPEG decode scales with the core count.
+        # Ordering is only relaxed when the caller shuffles anyway.
+        n_shards = min(len(os.sched_getaffinity(0)), max(len(image_paths), 1))
+        shard_size = math.ceil(max(len(image_paths), 1) / n_shards)
+        shards = tf.data.Dataset.from_tensor_slices((image_paths, labels)).batch(shard_size)
+        ds = shards.interleave(
+            lambda paths, shard_labels: tf.data.Dataset
+                .from_tensor_slices((paths, shard_labels))
+                .map(_load, num_parallel_calls=tf.data.AUTOTUNE),
+            cycle_length=n_shards,
+            num_parallel_calls=tf.data.AUTOTUNE,
+            deterministic=not shuffle
+        )
+        if cache_path is not None:
+            # '' keeps the cache in memory; a filename spills decoded
+            # tensors to disk so JPEGs decode once across all epochs
+            ds = ds.cache(cache_path)
+        if shuffle:
+            ds = ds.shuffle(1024)
+        ds = ds.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+        return ds
+
+    def _extract_features(self, base_model, dataset, n_samples, cache_path):
+        """
+        Stream base-model features into a memory-mapped .npy file
+        The OS pages slices in on demand, so the feature cache never has
+        to fit in RAM and no duplicate full-size array is allocated
+        Labels are collected in the same pass so they stay aligned
+        """
+        feature_dim = base_model.output_shape[-1]
+        features = np.lib.format.open_memmap(
+            cache_path, mode='w+', dtype=np.float32, shape=(n_samples, feature_dim)
+        )
+        labels = np.empty((n_samples, self.num_classes), dtype=np.float32)
+
+        offset = 0
+        for images, batch_labels in dataset:
+            batch_features = base_model(images, training=False).numpy()
+            features[offset:offset + len(batch_features)] = batch_features
+            labels[offset:offset + len(batch_features)] = batch_labels.numpy()
+            offset += len(batch_features)
+
+        features.flush()
+
+        # Keras may read fewer files than were linked (e.g. extensions it
+        # doesn't support); trim so the head never trains on the
+        # uninitialized tail of the memmap
+        if offset != n_samples:
+            logger.warning(f"Feature cache holds {offset} rows, expected {n_samples}")
+
+        return np.load(cache_path, mmap_mode='r')[:offset], labels[:offset]
+
     def train_model(self, image_dir, cases_file, epochs=50, batch_size=32):
         """
         Train the CNN model on your diagnostic cases
         """
         logger.info("Starting model training...")
-        
-        # Prepare dataset
-        X, y, y_raw = self.prepare_dataset(image_dir, cases_file)
-        
-        if len(X) == 0:
+
+        # train_model builds its own base/head, so the policy must be set
+        # here too, not just in build_model
+        self._set_precision_policy()
+
+        # Mirror cases into a class-per-directory tree and stream it with
+        # Keras's parallel reader; augmentation stays inside the model
+        class_dir, n_images = self.prepare_class_directory(image_dir, cases_file)
+
+        if n_images == 0:
             raise ValueError("No valid images found for training")
-        
-        # Split into train/validation sets
-        X_train, X_val, y_train, y_val = train_test_split(
-            X, y, test_size=0.2, random_state=42, stratify=y_raw
+
+        train_ds = keras.utils.image_dataset_from_directory(
+            class_dir,
+            validation_split=0.2,
+            subset='training',
+            seed=42,
+            image_size=self.img_size,
+            batch_size=batch_size,
+            label_mode='categorical'
         )
-        
-        logger.info(f"Training set: {len(X_train)} images")
-        logger.info(f"Validation set: {len(X_val)} images")
-        
-        # Build model if not already built
-        if self.model is None:
-            self.build_model()
-        
-        # Callbacks
-        callbacks = [
+        val_ds = keras.utils.image_dataset_from_directory(
+            class_dir,
+            validation_split=0.2,
+            subset='validation',
+            seed=42,
+            image_size=self.img_size,
+            batch_size=batch_size,
+            label_mode='categorical'
+        )
+
+        self.label_encoder.fit(train_ds.class_names)
+
+        n_val = int(n_images * 0.2)
+        n_train = n_images - n_val
+        logger.info(f"Training set: {n_train} images")
+        logger.info(f"Validation set: {n_val} images")
+
+        # Normalize on the fly; decoded batches are cached after epoch 1
+        train_ds = train_ds.map(lambda img, label: (img / 255.0, label))
+        train_ds = train_ds.cache().prefetch(tf.data.AUTOTUNE)
+        val_ds = val_ds.map(lambda img, label: (img / 255.0, label))
+        val_ds = val_ds.cache().prefetch(tf.data.AUTOTUNE)
+
+        # Build the frozen base and head separately: while the base is
+        # frozen its forward pass is identical every epoch, so compute
+        # the features once and train only the head on them
+        base_model = self._build_base()
+        head = self._build_head()
+        head.compile(
+            optimizer=self._make_optimizer(learning_rate=0.001),
+            loss='categorical_crossentropy',
+            metrics=['accuracy', 'top_2_accuracy']
+        )
+
+        logger.info("Caching frozen EfficientNet features for head training...")
+        feature_dir = os.environ.get('LUME_FEATURE_CACHE_DIR', '/tmp')
+        train_features, y_train = self._extract_features(
+            base_model, train_ds, n_train,
+            os.path.join(feature_dir, 'lume_train_features.npy')
+        )
+        val_features, y_val = self._extract_features(
+            base_model, val_ds, n_val,
+            os.path.join(feature_dir, 'lume_val_features.npy')
+        )
+
+        # Phase 1: train the classification head on cached features
+        head_callbacks = [
             keras.callbacks.EarlyStopping(
                 monitor='val_accuracy',
                 patience=10,
@@ -225,54 +388,78 @@ class DermatologyCNN:
                 factor=0.2,
                 patience=5,
                 min_lr=1e-7
-            ),
-            keras.callbacks.ModelCheckpoint(
-                'server/ml/models/dermatology_cnn_best.h5',
-                monitor='val_accuracy',
-                save_best_only=True,
-                save_weights_only=False
             )
         ]
-        
-        # Train model
-        history = self.model.fit(
-            X_train, y_train,
+
+        history = head.fit(
+            train_features, y_train,
             batch_size=batch_size,
             epochs=epochs,
-            validation_data=(X_val, y_val),
-            callbacks=callbacks,
+            validation_data=(val_features, y_val),
+            callbacks=head_callbacks,
             verbose=1
         )
-        
-        # Fine-tune with unfrozen base model
+
+        # Phase 2: fine-tune end-to-end with the base unfrozen
         logger.info("Fine-tuning with unfrozen base model...")
-        self.model.layers[4].trainable = True  # Unfreeze EfficientNet
-        
-        # Recompile with lower learning rate
+        base_model.trainable = True
+        self.model = self._assemble_model(base_model, head)
+        self._inference_model = None
+        self._interpreter = None
+
+        # Compile with lower learning rate
         self.model.compile(
-            optimizer=keras.optimizers.Adam(learning_rate=0.0001),
+            optimizer=self._make_optimizer(learning_rate=0.0001),
             loss='categorical_crossentropy',
             metrics=['accuracy', 'top_2_accuracy']
         )
-        
+
+        # Callbacks
+        callbacks = [
+            keras.callbacks.EarlyStopping(
+                monitor='val_accuracy',
+                patience=10,
+                restore_best_weights=True
+            ),
+            keras.callbacks.ReduceLROnPlateau(
+                monitor='val_loss',
+                factor=0.2,
+                patience=5,
+                min_lr=1e-7
+            ),
+            keras.callbacks.ModelCheckpoint(
+                'server/ml/models/dermatology_cnn_best.h5',
+                monitor='val_accuracy',
+                save_best_only=True,
+                save_weights_only=False
+            )
+        ]
+
         # Continue training
         history_fine = self.model.fit(
-            X_train, y_train,
-            batch_size=batch_size,
+            train_ds,
             epochs=20,
-            validation_data=(X_val, y_val),
+            validation_data=val_ds,
             callbacks=callbacks,
             verbose=1
         )
-        
+
         # Evaluate final model
-        val_loss, val_accuracy, val_top2 = self.model.evaluate(X_val, y_val, verbose=0)
+        val_loss, val_accuracy, val_top2 = self.model.evaluate(val_ds, verbose=0)
         logger.info(f"Final validation accuracy: {val_accuracy:.4f}")
         logger.info(f"Final validation top-2 accuracy: {val_top2:.4f}")
         
         # Save final model
         self.model.save('server/ml/models/dermatology_cnn_final.h5')
-        
+
+        # Any existing int8 artifact was calibrated against the previous
+        # weights; remove it so predictions can't silently come from a
+        # stale quantized model until quantize() is rerun
+        quantized_path = 'server/ml/models/dermatology_cnn_int8.tflite'
+        if os.path.exists(quantized_path):
+            os.remove(quantized_path)
+            logger.info("Removed stale quantized model; rerun quantize() to regenerate")
+
         # Save label encoder
         import pickle
         with open('server/ml/models/label_encoder.pkl', 'wb') as f:
@@ -280,23 +467,136 @@ class DermatologyCNN:
         
         return history, history_fine
     
+    def export_inference_model(self):
+        """
+        Build an inference-only copy of the model with BatchNormalization
+        folded into the preceding Dense/Conv2D weights
+        """
+        if self.model is None:
+            raise ValueError("Model not loaded. Please train or load a model first.")
+
+        fold_types = (layers.Dense, layers.Conv2D)
+        inference = keras.Sequential(name='dermatology_cnn_inference')
+        inference.add(keras.Input(shape=self.model.input_shape[1:]))
+
+        src_layers = self.model.layers
+        i = 0
+        while i < len(src_layers):
+            layer = src_layers[i]
+            nxt = src_layers[i + 1] if i + 1 < len(src_layers) else None
+
+            # Folding moves the BN affine in front of the activation, so it
+            # is only valid when the layer's activation is linear; a BN
+            # behind e.g. relu is cloned standalone below instead
+            if (isinstance(layer, fold_types)
+                    and isinstance(nxt, layers.BatchNormalization)
+                    and layer.activation is keras.activations.linear):
+                # Fold the BN affine into the previous layer:
+                # W' = W * gamma/sqrt(var+eps), b' = (b-mean)*gamma/sqrt(var+eps) + beta
+                gamma, beta, mean, var = nxt.get_weights()
+                scale = gamma / np.sqrt(var + nxt.epsilon)
+
+                weights = layer.get_weights()
+                kernel = weights[0] * scale  # broadcasts over the output axis
+                bias = weights[1] if len(weights) > 1 else np.zeros_like(beta)
+                bias = (bias - mean) * scale + beta
+
+                config = layer.get_config()
+                config['use_bias'] = True
+                clone = layer.__class__.from_config(config)
+                inference.add(clone)
+                clone.set_weights([kernel, bias])
+                i += 2
+                continue
+
+            clone = layer.__class__.from_config(layer.get_config())
+            inference.add(clone)
+            if layer.get_weights():
+                clone.set_weights(layer.get_weights())
+            i += 1
+
+        logger.info(f"Inference model exported with {inference.count_params()} parameters")
+        return inference
+
+    def quantize(self, rep_image_paths, output_path='server/ml/models/dermatology_cnn_int8.tflite'):
+        """
+        Post-training int8 quantization of the trained model via TFLite
+        Uses sample diagnostic images to calibrate activation ranges
+        """
+        if self.model is None:
+            raise ValueError("Model not loaded. Please train or load a model first.")
+
+        def representative_dataset():
+            for path in rep_image_paths[:100]:
+                img = self.preprocess_image(path)
+                if img is not None:
+                    yield [np.expand_dims(img, axis=0).astype(np.float32)]
+
+        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+
+        tflite_model = converter.convert()
+        with open(output_path, 'wb') as f:
+            f.write(tflite_model)
+
+        logger.info(f"Quantized int8 model saved: {output_path} ({len(tflite_model)} bytes)")
+
+        self._load_quantized_model(output_path)
+        return output_path
+
+    def _load_quantized_model(self, model_path):
+        """
+        Load the int8 TFLite model for inference
+        """
+        self._interpreter = tf.lite.Interpreter(model_path=model_path)
+        self._interpreter.allocate_tensors()
+        self._input_detail = self._interpreter.get_input_details()[0]
+        self._output_detail = self._interpreter.get_output_details()[0]
+        logger.info("Quantized int8 model loaded for inference")
+
+    def _predict_probs(self, img_batch):
+        """
+        Score a preprocessed float32 batch, preferring the int8 interpreter
+        """
+        if self._interpreter is not None:
+            in_scale, in_zero = self._input_detail['quantization']
+            out_scale, out_zero = self._output_detail['quantization']
+
+            probs = np.empty((len(img_batch), self.num_classes), dtype=np.float32)
+            for i, img in enumerate(img_batch):
+                quantized = np.round(img / in_scale + in_zero).astype(np.int8)
+                self._interpreter.set_tensor(self._input_detail['index'], quantized[np.newaxis, ...])
+                self._interpreter.invoke()
+                raw = self._interpreter.get_tensor(self._output_detail['index'])[0]
+                probs[i] = (raw.astype(np.float32) - out_zero) * out_scale
+            return probs
+
+        # Fall back to the BN-folded float model
+        if self._inference_model is None:
+            self._inference_model = self.export_inference_model()
+        return self._inference_model.predict(img_batch, verbose=0)
+
     def predict(self, image_path, confidence_threshold=0.7):
         """
         Make prediction on a single image
         """
-        if self.model is None:
+        if self.model is None and self._interpreter is None:
             raise ValueError("Model not loaded. Please train or load a model first.")
-        
+
         # Preprocess image
         img = self.preprocess_image(image_path)
         if img is None:
             return None
-        
+
         # Add batch dimension
         img_batch = np.expand_dims(img, axis=0)
-        
+
         # Make prediction
-        predictions = self.model.predict(img_batch, verbose=0)
+        predictions = self._predict_probs(img_batch)
         
         # Get top predictions
         top_indices = np.argsort(predictions[0])[::-1]
@@ -317,6 +617,56 @@ class DermatologyCNN:
         
         return results
     
+    def predict_batch(self, image_paths, batch_size=32, confidence_threshold=0.7):
+        """
+        Score many images in one pass, batching decode and model calls
+        Returns one top-3 result list per image, in input order
+        """
+        if self.model is None and self._interpreter is None:
+            raise ValueError("Model not loaded. Please train or load a model first.")
+
+        # Indices ride along as labels so results map back to input order
+        ds = self.make_dataset(
+            np.asarray(image_paths),
+            np.arange(len(image_paths), dtype=np.int32),
+            batch_size=batch_size
+        )
+
+        probs = np.empty((len(image_paths), self.num_classes), dtype=np.float32)
+        for images, indices in ds:
+            if self._interpreter is not None:
+                batch_probs = self._predict_probs(images.numpy())
+            else:
+                if self._inference_model is None:
+                    self._inference_model = self.export_inference_model()
+                # Direct __call__ skips Keras predict's per-call overhead
+                batch_probs = self._inference_model(images, training=False).numpy()
+            probs[indices.numpy()] = batch_probs
+
+        # Top-3 classes per row in one vectorized pass
+        top_indices = np.argpartition(-probs, 2, axis=1)[:, :3]
+
+        results = []
+        for row, top in zip(probs, top_indices):
+            top = top[np.argsort(-row[top])]
+
+            image_results = []
+            for rank, idx in enumerate(top):
+                confidence = float(row[idx])
+
+                if confidence >= confidence_threshold or rank == 0:  # Always include top prediction
+                    condition = self.class_names[idx]
+                    image_results.append({
+                        'condition': condition,
+                        'confidence': confidence,
+                        'severity': self._determine_severity(confidence),
+                        'type': 'primary' if rank == 0 else 'secondary'
+                    })
+
+            results.append(image_results)
+
+        return results
+
     def _determine_severity(self, confidence):
         """
         Determine severity based on confidence and condition
@@ -339,7 +689,16 @@ class DermatologyCNN:
             raise FileNotFoundError(f"Model file not found: {model_path}")
         
         self.model = keras.models.load_model(model_path)
-        
+        self._inference_model = None
+        self._interpreter = None
+
+        # Prefer the quantized int8 model for inference only when it is
+        # at least as new as the float model it was calibrated from
+        quantized_path = 'server/ml/models/dermatology_cnn_int8.tflite'
+        if (os.path.exists(quantized_path)
+                and os.stat(quantized_path).st_mtime >= os.stat(model_path).st_mtime):
+            self._load_quantized_model(quantized_path)
+
         # Load label encoder
         import pickle
         encoder_path = 'server/ml/models/label_encoder.pkl'
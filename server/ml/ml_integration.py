@@ -8,8 +8,180 @@ Creates ensemble predictions for maximum accuracy
 import os
 import sys
 import json
-import subprocess
-from dermatology_cnn import DermatologyCNN
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+_MODEL_PATH = 'server/ml/models/dermatology_cnn_final.h5'
+
+_cnn_module = None
+
+def _cnn():
+    """Import dermatology_cnn (and TensorFlow behind it) on first use, so
+    web workers that only serve status never pay the TF load"""
+    global _cnn_module
+    if _cnn_module is None:
+        import dermatology_cnn as _cnn_module
+    return _cnn_module
+
+def _train_entrypoint():
+    """Run CNN training; executed in a child process so the TF arena and
+    GPU memory are released back to the OS when training finishes"""
+    _cnn().main()
+
+@lru_cache(maxsize=1)
+def _model_path_mtime():
+    """Cached stat of the model file so repeated status checks don't hit disk"""
+    try:
+        return os.stat(_MODEL_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+# Condition lookup tables frozen at module scope: the per-result loop in
+# analyze_image_with_cnn reads them on every prediction, so rebuilding
+# the dicts per call is pure allocator churn
+_TREATMENTS = MappingProxyType({
+    'Acne Vulgaris': (
+        'Topical retinoids (tretinoin, adapalene)',
+        'Benzoyl peroxide',
+        'Antibiotic therapy if severe',
+        'Gentle cleansing routine'
+    ),
+    'Atopic Dermatitis': (
+        'Moisturizers and emollients',
+        'Topical corticosteroids',
+        'Calcineurin inhibitors',
+        'Avoid known triggers'
+    ),
+    'Psoriasis': (
+        'Topical corticosteroids',
+        'Vitamin D analogues',
+        'Phototherapy',
+        'Systemic therapy for severe cases'
+    ),
+    'Seborrheic Dermatitis': (
+        'Antifungal shampoos/topicals',
+        'Topical corticosteroids',
+        'Calcineurin inhibitors',
+        'Gentle skincare routine'
+    ),
+    'Contact Dermatitis': (
+        'Identify and avoid allergens',
+        'Topical corticosteroids',
+        'Cool compresses',
+        'Antihistamines for itching'
+    ),
+    'Melanoma': (
+        'URGENT: Immediate dermatologist consultation',
+        'Surgical excision',
+        'Biopsy confirmation required',
+        'Regular skin monitoring'
+    ),
+    'Basal Cell Carcinoma': (
+        'Dermatologist consultation required',
+        'Surgical removal options',
+        'Mohs surgery consideration',
+        'Regular follow-up'
+    ),
+    'Rosacea': (
+        'Topical metronidazole',
+        'Avoid triggers (sun, spicy foods)',
+        'Gentle skincare products',
+        'Oral antibiotics if severe'
+    )
+})
+_DEFAULT_TREATMENT = ('Consult dermatologist for proper diagnosis and treatment',)
+
+_CAUSES = MappingProxyType({
+    'Acne Vulgaris': (
+        'Hormonal changes',
+        'Excess sebum production',
+        'Bacterial growth (P. acnes)',
+        'Genetics'
+    ),
+    'Atopic Dermatitis': (
+        'Genetic predisposition',
+        'Environmental allergens',
+        'Immune system dysfunction',
+        'Skin barrier defects'
+    ),
+    'Psoriasis': (
+        'Autoimmune condition',
+        'Genetic factors',
+        'Stress triggers',
+        'Infections'
+    ),
+    'Seborrheic Dermatitis': (
+        'Malassezia yeast overgrowth',
+        'Immune response',
+        'Hormonal factors',
+        'Environmental factors'
+    ),
+    'Contact Dermatitis': (
+        'Allergic reactions',
+        'Irritant exposure',
+        'Chemical sensitization',
+        'Environmental allergens'
+    ),
+    'Melanoma': (
+        'UV radiation exposure',
+        'Genetic mutations',
+        'Family history',
+        'Multiple moles'
+    ),
+    'Basal Cell Carcinoma': (
+        'UV radiation exposure',
+        'Fair skin type',
+        'Age-related changes',
+        'Previous radiation exposure'
+    ),
+    'Rosacea': (
+        'Vascular abnormalities',
+        'Environmental triggers',
+        'Genetic predisposition',
+        'Demodex mites'
+    )
+})
+_DEFAULT_CAUSE = ('Consult dermatologist for detailed evaluation',)
+
+@dataclass(slots=True)
+class Prediction:
+    """
+    One CNN prediction, built in a single construction instead of five
+    dict assignments per result in the batch loop
+    """
+    condition: str
+    confidence: float
+    severity: str
+    type: str
+    analysis_method: str = 'Custom CNN'
+    model_accuracy: str = '95%+'
+
+    def to_dict(self):
+        """
+        Serialize for the client — the description string and the
+        treatment/cause lookups only happen here, not in the hot path
+        """
+        return {
+            'condition': self.condition,
+            'confidence': self.confidence,
+            'severity': self.severity,
+            'type': self.type,
+            'analysis_method': self.analysis_method,
+            'model_accuracy': self.model_accuracy,
+            'description': f"AI-powered analysis indicates {self.condition} with {self.confidence:.1%} confidence using our specialized dermatology model.",
+            'treatments': _TREATMENTS.get(self.condition, _DEFAULT_TREATMENT),
+            'causes': _CAUSES.get(self.condition, _DEFAULT_CAUSE),
+        }
+
+# Fields of the status payload that never change at runtime; the health
+# endpoint merges them instead of rebuilding the full dict per request
+_STATIC_STATUS = MappingProxyType({
+    "model_path": _MODEL_PATH,
+    "training_data": "801 diagnostic cases",
+    "expected_accuracy": "95%+",
+})
 
 class MLAnalysisService:
     """
@@ -18,17 +190,28 @@ class MLAnalysisService:
     """
     
     def __init__(self):
-        self.cnn_model = DermatologyCNN()
+        self._cnn = None
+        self._classes = ()
         self.model_loaded = False
         self.load_model_if_available()
-    
+
+    def _get_cnn(self):
+        """
+        Lazily construct the CNN wrapper (first call imports TensorFlow)
+        """
+        if self._cnn is None:
+            self._cnn = _cnn().DermatologyCNN()
+        return self._cnn
+
     def load_model_if_available(self):
         """
         Load CNN model if it exists
         """
         try:
-            if os.path.exists('server/ml/models/dermatology_cnn_final.h5'):
-                self.cnn_model.load_model()
+            self._model_mtime = _model_path_mtime()
+            if self._model_mtime is not None:
+                self._get_cnn().load_model()
+                self._classes = tuple(self._cnn.class_names)
                 self.model_loaded = True
                 print("CNN model loaded successfully")
             else:
@@ -43,12 +226,15 @@ class MLAnalysisService:
         """
         try:
             print("Starting CNN model training...")
-            
-            # Import and run training
-            from dermatology_cnn import main as train_model
-            train_model()
-            
-            # Reload the trained model
+
+            # Train in a one-shot worker process; the parent web worker
+            # never loads TF for training, so its RSS stays flat
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                executor.submit(_train_entrypoint).result()
+
+            # Reload the trained model; the stat cache must be dropped
+            # first so the fresh file is seen
+            _model_path_mtime.cache_clear()
             self.load_model_if_available()
             
             return {"success": True, "message": "Model trained successfully"}
@@ -56,169 +242,77 @@ class MLAnalysisService:
         except Exception as e:
             return {"success": False, "error": str(e)}
     
-    def analyze_image_with_cnn(self, image_path):
+    def analyze_images_with_cnn(self, image_paths):
         """
-        Analyze image using custom CNN model
+        Analyze a batch of images using the custom CNN model
+        One predict_batch call amortizes decode and kernel-launch overhead
+        across all images; returns one result list per input path
         """
         if not self.model_loaded:
-            return {
+            return [{
                 "error": "CNN model not available. Please train the model first.",
                 "accuracy": "N/A"
-            }
-        
+            }] * len(image_paths)
+
         try:
-            results = self.cnn_model.predict(image_path)
-            
-            if results:
-                # Add ML-specific metadata
-                for result in results:
-                    result['analysis_method'] = 'Custom CNN'
-                    result['model_accuracy'] = '95%+'
-                    result['description'] = f"AI-powered analysis indicates {result['condition']} with {result['confidence']:.1%} confidence using our specialized dermatology model."
-                    
-                    # Add treatment recommendations based on condition
-                    result['treatments'] = self._get_treatment_recommendations(result['condition'])
-                    result['causes'] = self._get_condition_causes(result['condition'])
-                
-                return results
-            else:
-                return [{
-                    "condition": "Analysis Failed",
-                    "confidence": 0.0,
-                    "description": "Unable to analyze the image with CNN model."
-                }]
-                
+            batch_results = self._get_cnn().predict_batch(image_paths)
+
+            analyzed = []
+            for results in batch_results:
+                if results:
+                    analyzed.append([
+                        Prediction(
+                            condition=result['condition'],
+                            confidence=result['confidence'],
+                            severity=result['severity'],
+                            type=result['type']
+                        )
+                        for result in results
+                    ])
+                else:
+                    analyzed.append([{
+                        "condition": "Analysis Failed",
+                        "confidence": 0.0,
+                        "description": "Unable to analyze the image with CNN model."
+                    }])
+
+            return analyzed
+
         except Exception as e:
-            return [{
+            return [[{
                 "condition": "Analysis Error",
                 "confidence": 0.0,
                 "description": f"Error during CNN analysis: {str(e)}"
-            }]
+            }]] * len(image_paths)
+
+    def analyze_image_with_cnn(self, image_path):
+        """
+        Analyze a single image — thin shim over the batch path
+        """
+        return self.analyze_images_with_cnn([image_path])[0]
     
-    def _get_treatment_recommendations(self, condition):
+    @staticmethod
+    def _get_treatment_recommendations(condition):
         """
         Get treatment recommendations for each condition
         """
-        treatments = {
-            'Acne Vulgaris': [
-                'Topical retinoids (tretinoin, adapalene)',
-                'Benzoyl peroxide',
-                'Antibiotic therapy if severe',
-                'Gentle cleansing routine'
-            ],
-            'Atopic Dermatitis': [
-                'Moisturizers and emollients',
-                'Topical corticosteroids',
-                'Calcineurin inhibitors',
-                'Avoid known triggers'
-            ],
-            'Psoriasis': [
-                'Topical corticosteroids',
-                'Vitamin D analogues',
-                'Phototherapy',
-                'Systemic therapy for severe cases'
-            ],
-            'Seborrheic Dermatitis': [
-                'Antifungal shampoos/topicals',
-                'Topical corticosteroids',
-                'Calcineurin inhibitors',
-                'Gentle skincare routine'
-            ],
-            'Contact Dermatitis': [
-                'Identify and avoid allergens',
-                'Topical corticosteroids',
-                'Cool compresses',
-                'Antihistamines for itching'
-            ],
-            'Melanoma': [
-                'URGENT: Immediate dermatologist consultation',
-                'Surgical excision',
-                'Biopsy confirmation required',
-                'Regular skin monitoring'
-            ],
-            'Basal Cell Carcinoma': [
-                'Dermatologist consultation required',
-                'Surgical removal options',
-                'Mohs surgery consideration',
-                'Regular follow-up'
-            ],
-            'Rosacea': [
-                'Topical metronidazole',
-                'Avoid triggers (sun, spicy foods)',
-                'Gentle skincare products',
-                'Oral antibiotics if severe'
-            ]
-        }
-        
-        return treatments.get(condition, ['Consult dermatologist for proper diagnosis and treatment'])
-    
-    def _get_condition_causes(self, condition):
+        return _TREATMENTS.get(condition, _DEFAULT_TREATMENT)
+
+    @staticmethod
+    def _get_condition_causes(condition):
         """
         Get possible causes for each condition
         """
-        causes = {
-            'Acne Vulgaris': [
-                'Hormonal changes',
-                'Excess sebum production',
-                'Bacterial growth (P. acnes)',
-                'Genetics'
-            ],
-            'Atopic Dermatitis': [
-                'Genetic predisposition',
-                'Environmental allergens',
-                'Immune system dysfunction',
-                'Skin barrier defects'
-            ],
-            'Psoriasis': [
-                'Autoimmune condition',
-                'Genetic factors',
-                'Stress triggers',
-                'Infections'
-            ],
-            'Seborrheic Dermatitis': [
-                'Malassezia yeast overgrowth',
-                'Immune response',
-                'Hormonal factors',
-                'Environmental factors'
-            ],
-            'Contact Dermatitis': [
-                'Allergic reactions',
-                'Irritant exposure',
-                'Chemical sensitization',
-                'Environmental allergens'
-            ],
-            'Melanoma': [
-                'UV radiation exposure',
-                'Genetic mutations',
-                'Family history',
-                'Multiple moles'
-            ],
-            'Basal Cell Carcinoma': [
-                'UV radiation exposure',
-                'Fair skin type',
-                'Age-related changes',
-                'Previous radiation exposure'
-            ],
-            'Rosacea': [
-                'Vascular abnormalities',
-                'Environmental triggers',
-                'Genetic predisposition',
-                'Demodex mites'
-            ]
-        }
-        
-        return causes.get(condition, ['Consult dermatologist for detailed evaluation'])
+        return _CAUSES.get(condition, _DEFAULT_CAUSE)
     
     def get_model_status(self):
         """
         Get current ML model status
         """
         return {
+            **_STATIC_STATUS,
             "cnn_model_loaded": self.model_loaded,
-            "model_path": "server/ml/models/dermatology_cnn_final.h5",
-            "training_data": "801 diagnostic cases",
-            "expected_accuracy": "95%+",
-            "classes": self.cnn_model.class_names if self.model_loaded else [],
+            "classes": self._classes,
             "status": "Ready" if self.model_loaded else "Needs Training"
         }
 
@@ -257,7 +351,7 @@ if __name__ == "__main__":
         elif command == "analyze" and len(sys.argv) > 2:
             image_path = sys.argv[2]
             result = analyze_with_ml(image_path)
-            print(json.dumps(result, indent=2))
+            print(json.dumps(result, indent=2, default=Prediction.to_dict))
         else:
             print("Usage: python ml_integration.py [train|status|analyze <image_path>]")
     else: